@@ -1,9 +1,21 @@
+import asyncio
+import functools
 import logging
+import multiprocessing
 import os
-import math
+import shutil
+import struct
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, wait
+from pathlib import Path
+
 import ffmpeg
+from PIL import Image, ImageColor, ImageDraw, ImageFont
 
 from telegram import Update
+from telegram.error import TelegramError
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -19,6 +31,362 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Encoder settings. The preset can be tuned per deployment without a redeploy.
+X264_PRESET = os.environ.get("X264_PRESET", "veryfast")
+OUTPUT_FPS = 30
+# A keyframe every 2 s keeps clips seekable in Telegram's player
+GOP_SIZE = 2 * OUTPUT_FPS
+VAAPI_DEVICE = os.environ.get("VAAPI_DEVICE", "/dev/dri/renderD128")
+
+# Layout of the rendered clips. Make sure the font file is in the 'fonts' directory
+FONT_PATH = 'fonts/LiberationSans-Regular.ttf'
+CANVAS_SIZE = (1080, 1920)
+
+# How much of the video /no_overlay scans for keyframes before splitting
+KEYFRAME_PROBE_WINDOW = 30
+
+# send_video has its own 20 s write timeout default, which is too short for clip uploads
+UPLOAD_WRITE_TIMEOUT = 600
+
+# Progress is reported by editing one status message, at most every
+# PROGRESS_MIN_INTERVAL seconds and only when another 10% of clips is done
+PROGRESS_MIN_INTERVAL = 2.0
+
+# Intermediate files and finished clips go to tmpfs when it has room for them,
+# to keep them off the disk. Docker's default /dev/shm is only 64 MB.
+TMPFS_MIN_FREE = int(os.environ.get("TMPFS_MIN_FREE_MB", "1024")) * 1024 * 1024
+
+
+def _pick_work_dir() -> str:
+    """Returns /dev/shm if it exists and has TMPFS_MIN_FREE bytes free, else the temp dir."""
+    if os.path.isdir('/dev/shm') and shutil.disk_usage('/dev/shm').free >= TMPFS_MIN_FREE:
+        return '/dev/shm'
+    return tempfile.gettempdir()
+
+
+WORK_DIR = os.environ.get("WORK_DIR") or _pick_work_dir()
+logger.info("Writing intermediate files and clips to %s", WORK_DIR)
+
+# Clips are encoded in parallel; each ffmpeg process gets a few threads so
+# concurrent encodes share the cores instead of oversubscribing them.
+ENCODE_SEM = asyncio.Semaphore(int(os.environ.get("MAX_PARALLEL_ENCODES", "2")))
+ENCODE_THREADS = int(os.environ.get("ENCODE_THREADS", "2"))
+
+# CPU-bound preparation (overlay rendering) runs in worker processes. Workers
+# start lazily, after asyncio.to_thread has spawned threads, so they come from
+# a forkserver instead of forking this multithreaded process.
+PROC_POOL = ProcessPoolExecutor(
+    max_workers=min(4, os.cpu_count() or 1), mp_context=multiprocessing.get_context('forkserver')
+)
+
+# Hardware H.264 encoders in order of preference, falling back to libx264
+HW_ENCODER_CANDIDATES = ('h264_nvenc', 'h264_qsv', 'h264_vaapi', 'h264_videotoolbox')
+
+
+def _query_ffmpeg(listing: str) -> frozenset:
+    """Returns the names printed by `ffmpeg -<listing>`, e.g. encoders or filters."""
+    try:
+        output = subprocess.run(
+            ['ffmpeg', '-hide_banner', f'-{listing}'], capture_output=True, text=True, check=True
+        ).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return frozenset()
+    # Entries look like " V..... libx264  description"; skip the legend and headers
+    rows = (line.split() for line in output.splitlines())
+    return frozenset(row[1] for row in rows if len(row) >= 2 and row[1] != '=')
+
+
+# ffmpeg's capabilities are queried once at startup and reused for every job
+FFMPEG_ENCODERS = _query_ffmpeg('encoders')
+FFMPEG_FILTERS = _query_ffmpeg('filters')
+
+
+def _detect_hw_encoder() -> str:
+    """Returns the first hardware H.264 encoder usable on this host, or libx264."""
+    for encoder in HW_ENCODER_CANDIDATES:
+        if encoder not in FFMPEG_ENCODERS:
+            continue
+        # Builds list encoders even without a device behind them, so try a tiny encode
+        device_args = ['-vaapi_device', VAAPI_DEVICE] if encoder == 'h264_vaapi' else []
+        upload_args = ['-vf', 'format=nv12,hwupload'] if encoder == 'h264_vaapi' else []
+        trial = subprocess.run(
+            ['ffmpeg', '-hide_banner', '-loglevel', 'error', *device_args,
+             '-f', 'lavfi', '-i', 'color=s=256x256:d=0.1', *upload_args,
+             '-c:v', encoder, '-f', 'null', '-'],
+            capture_output=True,
+        )
+        if trial.returncode == 0:
+            return encoder
+    return 'libx264'
+
+
+HW_ENCODER = _detect_hw_encoder()
+# With NVENC, decode and scale on the GPU too if this build has scale_cuda
+CUDA_SCALE = HW_ENCODER == 'h264_nvenc' and 'scale_cuda' in FFMPEG_FILTERS
+logger.info("Using video encoder: %s (GPU scaling: %s)", HW_ENCODER, CUDA_SCALE)
+
+
+# The clip filter graph only depends on the encoder, so it is built once.
+# Input 0 is the chunk and input 1 the overlay PNG, which holds the background
+# color and all the text. The PNG is decoded once and repeated by the loop
+# filter rather than re-read for every frame, and the overlay ends with the chunk.
+FILTER_TEMPLATE = (
+    "[1:v]loop=loop=-1:size=1:start=0,setpts=N/({fps}*TB)[bg];"
+    "[0:v]{scale}[v];"
+    "[bg][v]overlay=x=(W-w)/2:y=(H-h)/2:shortest=1,fps={fps}{upload}[out]"
+)
+
+if CUDA_SCALE:
+    # Decode and scale on the GPU, then download for the CPU overlay
+    HW_INPUT_ARGS = ['-hwaccel', 'cuda', '-hwaccel_output_format', 'cuda']
+    FILTER_COMPLEX = FILTER_TEMPLATE.format(fps=OUTPUT_FPS, scale='scale_cuda=1000:-2,hwdownload,format=nv12', upload='')
+elif HW_ENCODER == 'h264_vaapi':
+    HW_INPUT_ARGS = ['-vaapi_device', VAAPI_DEVICE]
+    FILTER_COMPLEX = FILTER_TEMPLATE.format(fps=OUTPUT_FPS, scale='scale=1000:-1', upload=',format=nv12,hwupload')
+else:
+    HW_INPUT_ARGS = []
+    FILTER_COMPLEX = FILTER_TEMPLATE.format(fps=OUTPUT_FPS, scale='scale=1000:-1', upload='')
+
+
+def _encoder_args() -> list:
+    """Returns the ffmpeg output arguments for the selected video encoder."""
+    if HW_ENCODER == 'h264_nvenc':
+        return ['-c:v', HW_ENCODER, '-preset', 'p4', '-rc', 'vbr', '-cq', '23', '-g', str(GOP_SIZE)]
+    if HW_ENCODER == 'h264_qsv':
+        return ['-c:v', HW_ENCODER, '-global_quality', '23', '-g', str(GOP_SIZE)]
+    if HW_ENCODER == 'h264_vaapi':
+        return ['-c:v', HW_ENCODER, '-qp', '23', '-g', str(GOP_SIZE)]
+    if HW_ENCODER == 'h264_videotoolbox':
+        return ['-c:v', HW_ENCODER, '-q:v', '65', '-g', str(GOP_SIZE)]
+    return [
+        '-c:v', 'libx264', '-preset', X264_PRESET, '-g', str(GOP_SIZE),
+    ]
+
+
+async def _run_ffmpeg(cmd: list) -> None:
+    """Runs an ffmpeg command as a subprocess without blocking the event loop."""
+    proc = await asyncio.create_subprocess_exec(
+        *cmd, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.PIPE
+    )
+    try:
+        _, stderr = await proc.communicate()
+    except asyncio.CancelledError:
+        proc.kill()
+        await proc.wait()
+        raise
+    if proc.returncode != 0:
+        logger.error("ffmpeg failed: %s", stderr.decode(errors='replace')[-2000:])
+        raise ffmpeg.Error(cmd[0], None, stderr)
+
+
+@functools.lru_cache(maxsize=None)
+def _load_font(size: int) -> ImageFont.FreeTypeFont:
+    """Loads FONT_PATH at the given size, parsing the font file only once per size."""
+    return ImageFont.truetype(FONT_PATH, size)
+
+
+@functools.lru_cache(maxsize=4)
+def _render_background(title: str, channel: str, color: str) -> Image.Image:
+    """Draws the background color with the title and channel labels."""
+    background = Image.new('RGBA', CANVAS_SIZE, color)
+    draw = ImageDraw.Draw(background)
+    centre_x, centre_y = CANVAS_SIZE[0] // 2, CANVAS_SIZE[1] // 2
+
+    draw.text((centre_x, centre_y - 700), title, font=_load_font(70), fill='black', anchor='mm')
+
+    # Add a box behind the channel name for readability
+    channel_font = _load_font(40)
+    left, top, right, bottom = draw.textbbox((40, 40), channel, font=channel_font, anchor='la')
+    box = Image.new('RGBA', CANVAS_SIZE, (0, 0, 0, 0))
+    ImageDraw.Draw(box).rectangle((left - 10, top - 10, right + 10, bottom + 10), fill=(0, 0, 0, 128))
+    background.alpha_composite(box)
+    draw.text((40, 40), channel, font=channel_font, fill='white', anchor='la')
+    return background
+
+
+def _render_overlay(title: str, channel: str, color: str, part_num: int, overlay_path: str) -> None:
+    """Draws the full layout for one part and saves it as a PNG.
+
+    The background is cached, so each worker process draws the shared text only once.
+    """
+    overlay = _render_background(title, channel, color).copy()
+    centre_x, centre_y = CANVAS_SIZE[0] // 2, CANVAS_SIZE[1] // 2
+    ImageDraw.Draw(overlay).text(
+        (centre_x, centre_y + 700), f"PART {part_num}",
+        font=_load_font(60), fill='black', anchor='mm'
+    )
+    overlay.convert('RGB').save(overlay_path)
+
+
+def _remove_files(paths: list) -> None:
+    """Deletes the given files, skipping any that no longer exist."""
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _iter_boxes(f, start: int, end: int):
+    """Yields (type, payload_start, box_end) for each MP4 box between start and end."""
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        size, box_type = struct.unpack('>I4s', f.read(8))
+        header_size = 8
+        if size == 1:
+            size = struct.unpack('>Q', f.read(8))[0]
+            header_size = 16
+        elif size == 0:
+            size = end - offset
+        if size < header_size:
+            raise ValueError(f"corrupt {box_type!r} box")
+        yield box_type.decode('latin-1'), offset + header_size, offset + size
+        offset += size
+
+
+def _find_box(f, start: int, end: int, box_type: str):
+    """Returns (payload_start, box_end) of the first box_type box, or None."""
+    for found_type, payload_start, box_end in _iter_boxes(f, start, end):
+        if found_type == box_type:
+            return payload_start, box_end
+    return None
+
+
+def _trak_audio_codec(f, start: int, end: int):
+    """Returns the sample entry fourcc of a sound track, or None for other tracks."""
+    mdia = _find_box(f, start, end, 'mdia')
+    hdlr = mdia and _find_box(f, *mdia, 'hdlr')
+    if not hdlr:
+        return None
+    # hdlr: version/flags (4), pre_defined (4), handler_type (4)
+    f.seek(hdlr[0] + 8)
+    if f.read(4) != b'soun':
+        return None
+    minf = _find_box(f, *mdia, 'minf')
+    stbl = minf and _find_box(f, *minf, 'stbl')
+    stsd = stbl and _find_box(f, *stbl, 'stsd')
+    if not stsd:
+        return None
+    # stsd: version/flags (4), entry_count (4), then the first entry's size (4) and fourcc (4)
+    f.seek(stsd[0] + 12)
+    return f.read(4).decode('latin-1')
+
+
+def _parse_mp4(video_path: str) -> tuple:
+    """Reads (duration, audio fourcc) straight from the moov box of an MP4 file."""
+    duration, audio_fourcc = None, None
+    with open(video_path, 'rb') as f:
+        moov = _find_box(f, 0, os.fstat(f.fileno()).st_size, 'moov')
+        if not moov:
+            raise ValueError("no moov box")
+        for box_type, payload_start, box_end in _iter_boxes(f, *moov):
+            if box_type == 'mvhd':
+                f.seek(payload_start)
+                version = f.read(4)[0]
+                # Skip the creation and modification times
+                if version == 1:
+                    _, _, timescale, length = struct.unpack('>QQIQ', f.read(28))
+                else:
+                    _, _, timescale, length = struct.unpack('>IIII', f.read(16))
+                duration = length / timescale
+            elif box_type == 'trak' and audio_fourcc is None:
+                audio_fourcc = _trak_audio_codec(f, payload_start, box_end)
+    return duration, audio_fourcc
+
+
+def _probe_video(video_path: str) -> tuple:
+    """Returns (duration, audio_codec) for the video, where audio_codec is None without audio.
+
+    MP4 files are read directly; anything the box parser can't handle goes to ffprobe.
+    """
+    try:
+        duration, audio_fourcc = _parse_mp4(video_path)
+        if duration:
+            return duration, {'mp4a': 'aac'}.get(audio_fourcc, audio_fourcc)
+    except (OSError, ValueError, ZeroDivisionError, IndexError, struct.error) as e:
+        logger.info("Falling back to ffprobe for %s: %s", video_path, e)
+
+    probe = ffmpeg.probe(video_path)
+    audio_codec = next(
+        (s['codec_name'] for s in probe['streams'] if s['codec_type'] == 'audio'), None
+    )
+    return float(probe['format']['duration']), audio_codec
+
+
+async def _split_stream_copy(video_path: str, clip_duration: int, output_pattern: str) -> list:
+    """Splits the video at the keyframes nearest to each clip boundary without re-encoding.
+
+    Returns the chunk paths in order. output_pattern must contain a single %d.
+    """
+    # The segment list names exactly the chunks this run wrote, so files left
+    # behind by an earlier crashed run are never picked up
+    output_dir = os.path.dirname(output_pattern)
+    list_path = os.path.splitext(output_pattern.replace('%d', 'list'))[0] + '.txt'
+    try:
+        await _run_ffmpeg([
+            'ffmpeg', '-y', '-hide_banner', '-i', video_path, '-c', 'copy',
+            '-f', 'segment', '-segment_time', str(clip_duration),
+            '-segment_list', list_path, '-segment_list_type', 'flat',
+            '-segment_format_options', 'movflags=+faststart',
+            '-segment_start_number', '1', '-reset_timestamps', '1', output_pattern,
+        ])
+        with open(list_path) as f:
+            return [os.path.join(output_dir, name) for name in f.read().split()]
+    finally:
+        await asyncio.to_thread(_remove_files, [list_path])
+
+
+async def _encode_clip(part_num: int, chunk_path: str, overlay_path: str,
+                       overlay_ready: asyncio.Future, audio_codec: str, output_filename: str) -> tuple:
+    """Renders one chunk with the custom layout and returns (part_num, output_filename).
+
+    overlay_ready resolves once the PNG at overlay_path has been written.
+    """
+    # faststart moves the index to the front so Telegram can start playback
+    # before the whole clip is fetched
+    audio_args = ['-avoid_negative_ts', 'make_zero'] if audio_codec == 'copy' else []
+    cmd = [
+        'ffmpeg', '-y', '-hide_banner', *HW_INPUT_ARGS,
+        '-i', chunk_path, '-framerate', str(OUTPUT_FPS), '-i', overlay_path,
+        '-filter_complex', FILTER_COMPLEX, '-map', '[out]', '-map', '0:a?',
+        *_encoder_args(), '-c:a', audio_codec, *audio_args,
+        '-threads', str(ENCODE_THREADS), '-movflags', 'faststart', output_filename,
+    ]
+    await overlay_ready
+    async with ENCODE_SEM:
+        await _run_ffmpeg(cmd)
+    return part_num, output_filename
+
+
+async def _keyframe_interval(video_path: str):
+    """Returns the largest gap in seconds between keyframes in the first KEYFRAME_PROBE_WINDOW
+    seconds of video, or None if ffprobe fails.
+
+    With fewer than two keyframes in the window the gap is at least the window, so
+    KEYFRAME_PROBE_WINDOW is returned.
+    """
+    try:
+        proc = await asyncio.create_subprocess_exec(
+            'ffprobe', '-v', 'error', '-select_streams', 'v:0', '-skip_frame', 'nokey',
+            '-read_intervals', f'%+{KEYFRAME_PROBE_WINDOW}', '-show_entries', 'frame=best_effort_timestamp_time',
+            '-of', 'csv=p=0', video_path,
+            stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.DEVNULL,
+        )
+    except OSError as e:
+        logger.warning(f"Could not run ffprobe: {e}")
+        return None
+    stdout, _ = await proc.communicate()
+    if proc.returncode != 0:
+        return None
+    times = []
+    for line in stdout.decode().split():
+        try:
+            times.append(float(line.strip(',')))
+        except ValueError:
+            continue
+    gaps = [b - a for a, b in zip(times, times[1:])]
+    return max(gaps) if gaps else float(KEYFRAME_PROBE_WINDOW)
+
+
 # Define states for the conversation
 (GET_VIDEO, GET_TITLE, GET_CHANNEL, 
  GET_DURATION, GET_COLOR) = range(5)
@@ -27,20 +395,48 @@ logger = logging.getLogger(__name__)
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Starts the conversation and asks for a video."""
+    context.user_data['overlay'] = True
     await update.message.reply_text(
         "Hi! I can split your video into clips with a custom layout.\n\n"
         "Please send me the video you want to process. "
-        "For best results on this platform, please keep videos under 5-10 minutes."
+        "For best results on this platform, please keep videos under 5-10 minutes.\n\n"
+        "Just want to split it without the layout? Send /no_overlay instead."
+    )
+    return GET_VIDEO
+
+async def start_no_overlay(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Starts a conversation that only splits the video, and asks for a video."""
+    context.user_data['overlay'] = False
+    await update.message.reply_text(
+        "I'll split your video into clips as they are, without re-encoding.\n\n"
+        "Please send me the video you want to split."
     )
     return GET_VIDEO
 
 async def get_video(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Stores the video and asks for a title."""
+    """Stores the video and asks for a title, or for the duration without a layout."""
     video_file = await update.message.video.get_file()
-    video_path = f"{video_file.file_id}.mp4"
-    await video_file.download_to_drive(video_path)
-    
+    data = await video_file.download_as_bytearray()
+
+    # Every job gets its own directory for the source and all intermediates,
+    # so jobs running at the same time never share file names
+    job_dir = await asyncio.to_thread(tempfile.mkdtemp, prefix='job_', dir=WORK_DIR)
+    video_path = os.path.join(job_dir, 'source.mp4')
+    try:
+        await asyncio.to_thread(Path(video_path).write_bytes, data)
+    except OSError:
+        await asyncio.to_thread(shutil.rmtree, job_dir, ignore_errors=True)
+        raise
+
+    context.user_data['job_dir'] = job_dir
     context.user_data['video_path'] = video_path
+
+    if not context.user_data.get('overlay', True):
+        await update.message.reply_text("Great! What duration (in seconds) should each clip be? (e.g., 60)")
+        return GET_DURATION
+
+    # Probe in the background while the user answers the remaining questions
+    context.user_data['probe'] = asyncio.create_task(asyncio.to_thread(_probe_video, video_path))
     
     await update.message.reply_text(
         "Great! Now, what should be the main title for the clips? (e.g., 'Best of Animated')"
@@ -60,12 +456,19 @@ async def get_channel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int
     return GET_DURATION
 
 async def get_duration(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    """Stores the duration and asks for the background color."""
+    """Stores the duration and asks for the background color, or splits right away without a layout."""
     try:
-        context.user_data['duration'] = int(update.message.text)
+        duration = int(update.message.text)
     except ValueError:
         await update.message.reply_text("That's not a valid number. Please enter the duration in seconds.")
         return GET_DURATION
+    if duration <= 0:
+        await update.message.reply_text("The duration must be at least 1 second. Please enter the duration in seconds.")
+        return GET_DURATION
+    context.user_data['duration'] = duration
+
+    if not context.user_data.get('overlay', True):
+        return await split_and_send(update, context)
         
     await update.message.reply_text(
         "Almost done! What background color would you like?\n\n"
@@ -75,6 +478,11 @@ async def get_duration(update: Update, context: ContextTypes.DEFAULT_TYPE) -> in
 
 async def get_color_and_process(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Stores the color and starts the video processing job."""
+    try:
+        ImageColor.getrgb(update.message.text)
+    except ValueError:
+        await update.message.reply_text("I don't recognise that color. Please send a color name or a hex code like `#FAD9A1`.")
+        return GET_COLOR
     context.user_data['color'] = update.message.text
     
     await update.message.reply_text(
@@ -83,79 +491,83 @@ async def get_color_and_process(update: Update, context: ContextTypes.DEFAULT_TY
     )
     
     # --- The Core Processing Logic ---
+    job_dir = context.user_data['job_dir']
     try:
         user_data = context.user_data
         video_path = user_data['video_path']
         clip_duration = user_data['duration']
 
-        # Get video properties
-        probe = ffmpeg.probe(video_path)
-        total_duration = float(probe['format']['duration'])
-        num_clips = math.ceil(total_duration / clip_duration)
-        
-        await update.message.reply_text(f"Video detected. Total duration: {total_duration:.2f}s. I will create {num_clips} clips.")
-
-        for i in range(num_clips):
-            part_num = i + 1
-            start_time = i * clip_duration
-            output_filename = f"part_{part_num}_{context._user_id}.mp4"
-            
-            await update.message.reply_text(f"Processing Part {part_num}/{num_clips}...")
-
-            # Define streams
-            input_stream = ffmpeg.input(video_path, ss=start_time, t=clip_duration)
-            video_clip = input_stream.video.scale(1000, -1) # Scale video to fit
-            audio_clip = input_stream.audio
-
-            # Create background
-            background = ffmpeg.input(f"color=c={user_data['color']}:s=1080x1920", f='lavfi', t=clip_duration)
-
-            # Overlay video on background
-            processed_video = ffmpeg.overlay(background, video_clip, x='(W-w)/2', y='(H-h)/2')
-
-            # Add text (Title, Channel, Part)
-            # Make sure the font file is in the 'fonts' directory
-            font_path = 'fonts/LiberationSans-Regular.ttf'
-            
-            processed_video = ffmpeg.drawtext(
-                processed_video,
-                text=user_data['title'],
-                x='(w-text_w)/2',
-                y='(h-text_h)/2 - 700',
-                fontsize=70,
-                fontcolor='black',
-                fontfile=font_path
-            )
-            processed_video = ffmpeg.drawtext(
-                processed_video,
-                text=user_data['channel'],
-                x='40',
-                y='40',
-                fontsize=40,
-                fontcolor='white',
-                fontfile=font_path,
-                box=1, boxcolor='black@0.5', boxborderw=10 # Add a box for readability
-            )
-            processed_video = ffmpeg.drawtext(
-                processed_video,
-                text=f"PART {part_num}",
-                x='(w-text_w)/2',
-                y='(h-text_h)/2 + 700',
-                fontsize=60,
-                fontcolor='black',
-                fontfile=font_path
+        # Get video properties (probed in the background since the upload)
+        total_duration, source_audio = await user_data['probe']
+
+        # AAC audio can go into the clips as is; anything else is re-encoded
+        audio_codec = 'copy' if source_audio == 'aac' else 'aac'
+
+        # Cut the source into chunks with a cheap stream copy first, so each
+        # encode below only decodes its own chunk instead of seeking the source.
+        # Cuts land on keyframes, so clips can run slightly past clip_duration.
+        chunk_paths = await _split_stream_copy(video_path, clip_duration, os.path.join(job_dir, "chunk_%d.mp4"))
+        num_clips = len(chunk_paths)
+
+        detected_text = f"Video detected. Total duration: {total_duration:.2f}s. I will create {num_clips} clips."
+        status_message = await update.message.reply_text(detected_text)
+
+        # Render the overlays in worker processes; each clip waits only for its own
+        overlay_paths = [os.path.join(job_dir, f"overlay_{i + 1}.png") for i in range(num_clips)]
+        overlay_jobs = [
+            PROC_POOL.submit(
+                _render_overlay,
+                user_data['title'], user_data['channel'], user_data['color'], i + 1, overlay_paths[i]
             )
+            for i in range(num_clips)
+        ]
+
+        # Encode the clips in parallel (bounded by ENCODE_SEM) and send each
+        # one as soon as its encode finishes.
+        tasks = [
+            asyncio.create_task(_encode_clip(
+                i + 1, chunk_paths[i], overlay_paths[i], asyncio.wrap_future(overlay_jobs[i]),
+                audio_codec, os.path.join(job_dir, f"part_{i + 1}.mp4")
+            ))
+            for i in range(num_clips)
+        ]
+        try:
+            clips_sent, last_decile, last_edit = 0, 0, time.monotonic()
+            for finished in asyncio.as_completed(tasks):
+                part_num, output_filename = await finished
 
-            # Combine video and audio and run
-            output = ffmpeg.output(processed_video, audio_clip, output_filename, vcodec='libx264', acodec='aac', preset='fast', movflags='frag_keyframe+empty_moov')
-            ffmpeg.run(output, overwrite_output=True)
+                # Send the clip
+                await context.bot.send_video(
+                    chat_id=update.effective_chat.id, video=Path(output_filename),
+                    caption=f"Part {part_num}/{num_clips}", supports_streaming=True,
+                    write_timeout=UPLOAD_WRITE_TIMEOUT
+                )
 
-            # Send the clip
-            with open(output_filename, 'rb') as video_part:
-                await context.bot.send_video(chat_id=update.effective_chat.id, video=video_part, supports_streaming=True)
-            
-            # Clean up the generated clip
-            os.remove(output_filename)
+                # Clean up the generated clip and its inputs
+                await asyncio.to_thread(
+                    _remove_files, [output_filename, chunk_paths[part_num - 1], overlay_paths[part_num - 1]]
+                )
+
+                # Update the status message without spending the bot's rate limit on every clip
+                clips_sent += 1
+                decile = clips_sent * 10 // num_clips
+                now = time.monotonic()
+                if clips_sent == num_clips or (decile > last_decile and now - last_edit >= PROGRESS_MIN_INTERVAL):
+                    try:
+                        await status_message.edit_text(f"{detected_text}\nSent {clips_sent}/{num_clips} clips.")
+                    except TelegramError as e:
+                        logger.warning(f"Could not update progress: {e}")
+                    last_decile, last_edit = decile, now
+        finally:
+            # Stop any encodes still running if a clip failed
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            # Overlays already rendering can't be cancelled, so wait for them
+            # before the cleanup below looks for their PNGs
+            for job in overlay_jobs:
+                job.cancel()
+            await asyncio.to_thread(wait, overlay_jobs)
 
         await update.message.reply_text("All done! I have sent you all the clips.")
 
@@ -163,20 +575,71 @@ async def get_color_and_process(update: Update, context: ContextTypes.DEFAULT_TY
         logger.error(f"Error during processing: {e}")
         await update.message.reply_text(f"An error occurred during processing: {e}\nPlease try again.")
     finally:
-        # Clean up the original uploaded video
-        if os.path.exists(context.user_data['video_path']):
-            os.remove(context.user_data['video_path'])
+        # Clean up the original uploaded video and any intermediate files left over
+        await asyncio.to_thread(shutil.rmtree, job_dir, ignore_errors=True)
 
     return ConversationHandler.END
 
 
+async def split_and_send(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """Splits the video into clips by stream copy and sends them without any layout."""
+    await update.message.reply_text("All set! Splitting your video now, this should be quick.")
+
+    job_dir = context.user_data['job_dir']
+    try:
+        video_path = context.user_data['video_path']
+        clip_duration = context.user_data['duration']
+
+        # Copy cuts can only land on keyframes, so warn when they won't line up
+        keyframe_interval = await _keyframe_interval(video_path)
+        if keyframe_interval and keyframe_interval >= KEYFRAME_PROBE_WINDOW:
+            await update.message.reply_text(
+                f"Heads up: this video has keyframes {KEYFRAME_PROBE_WINDOW}s or more apart, "
+                f"so clips may run a lot longer than {clip_duration}s."
+            )
+        elif keyframe_interval:
+            offset = clip_duration % keyframe_interval
+            if min(offset, keyframe_interval - offset) > 0.5:
+                await update.message.reply_text(
+                    f"Heads up: this video only has a keyframe every {keyframe_interval:.1f}s, "
+                    f"so clips may run up to {keyframe_interval:.1f}s longer than {clip_duration}s."
+                )
+
+        chunk_paths = await _split_stream_copy(video_path, clip_duration, os.path.join(job_dir, "chunk_%d.mp4"))
+        for part_num, chunk_path in enumerate(chunk_paths, start=1):
+            await context.bot.send_video(
+                chat_id=update.effective_chat.id, video=Path(chunk_path),
+                caption=f"Part {part_num}/{len(chunk_paths)}", supports_streaming=True,
+                write_timeout=UPLOAD_WRITE_TIMEOUT
+            )
+            await asyncio.to_thread(_remove_files, [chunk_path])
+
+        await update.message.reply_text("All done! I have sent you all the clips.")
+
+    except Exception as e:
+        logger.error(f"Error during processing: {e}")
+        await update.message.reply_text(f"An error occurred during processing: {e}\nPlease try again.")
+    finally:
+        # Clean up the original uploaded video and any chunks left over
+        await asyncio.to_thread(shutil.rmtree, job_dir, ignore_errors=True)
+
+    return ConversationHandler.END
+
+
+async def still_processing(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Answers messages that arrive while the previous step is still running."""
+    await update.message.reply_text("I'm still working on your last request. Please wait until it's finished.")
+
+
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     """Cancels and ends the conversation."""
     user = update.message.from_user
     logger.info("User %s canceled the conversation.", user.first_name)
     # Clean up any downloaded file if conversation is cancelled
-    if 'video_path' in context.user_data and os.path.exists(context.user_data['video_path']):
-        os.remove(context.user_data['video_path'])
+    if 'probe' in context.user_data:
+        context.user_data.pop('probe').cancel()
+    if 'job_dir' in context.user_data:
+        await asyncio.to_thread(shutil.rmtree, context.user_data.pop('job_dir'), ignore_errors=True)
         
     await update.message.reply_text(
         "Operation cancelled. Send /start to begin again."
@@ -190,16 +653,32 @@ def main() -> None:
     if not TOKEN:
         raise ValueError("No TOKEN found in environment variables!")
 
-    application = Application.builder().token(TOKEN).build()
+    # A larger pool and generous timeouts let several clip uploads run at once
+    application = (
+        Application.builder()
+        .token(TOKEN)
+        .connection_pool_size(64)
+        .pool_timeout(30.0)
+        .read_timeout(120)
+        .get_updates_connection_pool_size(1)
+        .build()
+    )
 
     conv_handler = ConversationHandler(
-        entry_points=[CommandHandler("start", start)],
+        entry_points=[CommandHandler("start", start), CommandHandler("no_overlay", start_no_overlay)],
         states={
-            GET_VIDEO: [MessageHandler(filters.VIDEO, get_video)],
-            GET_TITLE: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_title)],
-            GET_CHANNEL: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_channel)],
-            GET_DURATION: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_duration)],
-            GET_COLOR: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_color_and_process)],
+            GET_VIDEO: [
+                MessageHandler(filters.VIDEO, get_video, block=False),
+                # /start offers /no_overlay while already waiting for the video
+                CommandHandler("no_overlay", start_no_overlay),
+            ],
+            GET_TITLE: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_title, block=False)],
+            GET_CHANNEL: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_channel, block=False)],
+            GET_DURATION: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_duration, block=False)],
+            GET_COLOR: [MessageHandler(filters.TEXT & ~filters.COMMAND, get_color_and_process, block=False)],
+            # Non-blocking steps leave the conversation pending; reply instead of dropping updates
+            # Edits don't carry update.message, so only new messages get the reply
+            ConversationHandler.WAITING: [MessageHandler(filters.UpdateType.MESSAGE, still_processing)],
         },
         fallbacks=[CommandHandler("cancel", cancel)],
     )